@@ -72,6 +72,7 @@ class App(tk.Tk):
         self.analysis_manager.update()
 
     def close_program(self):
+        self.file_manager.executor.shutdown(wait=False, cancel_futures=True)
         self.destroy()
 
 
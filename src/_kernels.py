@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+This module contains compiled kernels for the hot numerical loops. Numba is
+optional; if it can't be imported, HAVE_NUMBA is False and callers should use
+their NumPy implementations instead.
+"""
+
+import math
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    HAVE_NUMBA = False
+else:
+    HAVE_NUMBA = True
+
+
+if HAVE_NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def eval_gaussians(x, xc, A, w, y0, out):
+        """
+        Writes the sum of gaussians (xc, A, w) on top of baseline y0 into out,
+        for each point in x. Fuses the whole expression into one pass over x.
+        """
+        for i in prange(x.size):
+            s = y0
+            for k in range(xc.size):
+                d = (x[i] - xc[k]) / w[k]
+                s += A[k] * math.exp(-0.5*d*d)
+            out[i] = s
+        return out
+
+    @njit(cache=True, fastmath=True)
+    def closest_within(points, qx, qy, max_sq_distance):
+        """
+        Returns the index of the row of points (an (N, 2) array) closest to
+        (qx, qy), or -1 if its squared distance is more than max_sq_distance.
+        """
+        best = -1
+        best_sq_distance = np.inf
+        for i in range(points.shape[0]):
+            dx = points[i, 0] - qx
+            dy = points[i, 1] - qy
+            sq_distance = dx*dx + dy*dy
+            if sq_distance < best_sq_distance:
+                best = i
+                best_sq_distance = sq_distance
+        if best_sq_distance > max_sq_distance:
+            return -1
+        return best
+
+    # Compile (or load from cache) on import rather than on first use.
+    eval_gaussians(np.zeros(1), np.zeros(1), np.ones(1), np.ones(1), 0.0,
+                   np.empty(1))
+    closest_within(np.zeros((1, 2)), 0.0, 0.0, 1.0)
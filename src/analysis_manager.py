@@ -119,12 +119,12 @@ class AnalysisManager:
         """
         x, y = current_xy
         if len(curve.get_params()) > 1:
-            curve.set_params(xc=x, A=y)
+            curve.set_params(xc=abs(x), A=abs(y))
         else:
             curve.set_params(y=y)
         self.graph_manager.update_handle(curve, draw=False)
         self.graph_manager.update_line(curve, draw=False)
-        self.graph_manager.update_composite_curve_line(draw=True)
+        self.graph_manager.update_composite_curve_line()
 
 
 
@@ -146,17 +146,17 @@ class AnalysisManager:
         x, y = current_xy
         dx, dy = clickpoint - current_xy
         if len(curve.get_params()) > 1: # Avoids baselines.
-            updated_width = dx
-            curve.set_params(A=y, w=updated_width)
+            updated_width = abs(dx)
+            curve.set_params(A=abs(y), w=updated_width)
             if self.gauss_widths_locked():
                 self.gauss_width = updated_width
-                self._update_all_widths()
+                self._update_all_widths(draw=False)
 
         else:
             curve.set_params(y=y)
         self.graph_manager.update_handle(curve, draw=False)
         self.graph_manager.update_line(curve, draw=False)
-        self.graph_manager.update_composite_curve_line(draw=True)
+        self.graph_manager.update_composite_curve_line()
 
 
 
@@ -183,11 +183,12 @@ class AnalysisManager:
 
 
 
-    def _update_all_widths(self) -> None:
+    def _update_all_widths(self, draw: bool = True) -> None:
         """
         Sets the width of all Gaussian curves to the value of self.gauss_width.
         self.gauss_width can be None, so self.gauss_width_locked should always
-        be True when calling this helper function.
+        be True when calling this helper function. All lines are updated in
+        one batch, then drawn once if 'draw' is True.
         """
         qd = self.get_active_qd()
         curve_list = qd.composite_curve.curve_list
@@ -195,8 +196,9 @@ class AnalysisManager:
             for curve in curve_list:
                 if len(curve.get_params()) > 1:
                     curve.w = self.gauss_width
-                    self.graph_manager.update_line(curve)
-            self.graph_manager.update_composite_curve_line()
+            with self.graph_manager.batch_draw():
+                self.graph_manager.update_all_lines(draw=draw)
+                self.graph_manager.update_composite_curve_line(draw=draw)
             self.update_gauss_table()
 
 
@@ -264,15 +266,13 @@ class AnalysisManager:
         curve_param_list = get_curve_param_list(qd)
 
         header = ["Peak", "y0", "Area", "xc", "Amp", "w"]
-        table = "\t".join(header) + "\n"
+        rows = ["\t".join(header)]
 
         for curve_params in curve_param_list:
-            table += str(curve_params[0]) + "\t"
-            for param in curve_params[1:]:
-                table += f"{param:g}\t"
-            table += "\n"
+            rows.append(f"{curve_params[0]}\t"
+                        + "\t".join(f"{param:g}" for param in curve_params[1:]))
 
-        return table
+        return "\n".join(rows) + "\n"
 
 
 
@@ -305,17 +305,16 @@ class AnalysisManager:
         export_filename = "export.csv"
         export_path = os.path.join(export_directory, export_filename)
         export_file_exists = os.path.isfile(export_path)
-        csvfile = open(export_path, 'a', newline="")
 
         fieldnames = ["filename", "Peak", "y0", "Area", "xc", "Amp", "w"]
-        writer = csv.writer(csvfile)
-        if not export_file_exists:
-            writer.writerow(fieldnames)
-        writer.writerow("")
+        rows = [[qd.name] + curve_params for curve_params in curve_param_list]
 
-        for curve_params in curve_param_list:
-            row = [qd.name] + curve_params
-            writer.writerow(row)
+        with open(export_path, 'a', newline="", buffering=1<<16) as csvfile:
+            writer = csv.writer(csvfile)
+            if not export_file_exists:
+                writer.writerow(fieldnames)
+            writer.writerow("")
+            writer.writerows(rows)
 
 
 
@@ -332,19 +331,15 @@ class AnalysisManager:
         export_filename = "areas.csv"
         export_path = os.path.join(export_directory, export_filename)
         export_file_exists = os.path.isfile(export_path)
-        csvfile = open(export_path, 'a', newline="")
 
         fieldnames = ("Filename","Peak 1","Peak 2","Peak 3","Peak 4","Peak 5","Peak 6")
-        writer = csv.writer(csvfile)
-        if not export_file_exists:
-            writer.writerow(fieldnames)
+        row = [qd.name] + [curve_params[2] for curve_params in curve_param_list]
 
-        row = []
-        row.append(qd.name)
-
-        for curve_params in curve_param_list:
-            row.append(curve_params[2])
-        writer.writerow(row)
+        with open(export_path, 'a', newline="", buffering=1<<16) as csvfile:
+            writer = csv.writer(csvfile)
+            if not export_file_exists:
+                writer.writerow(fieldnames)
+            writer.writerow(row)
 
 
 
@@ -382,7 +377,7 @@ class AnalysisManager:
         new_gaussian = curves.Gaussian(xc=xc, A=A, w=w)
         qd.composite_curve.curve_list.append(new_gaussian)
         self.update_gauss_table()
-        self.graph_manager.update_plot()
+        self.graph_manager.add_curve_line(new_gaussian)
         self.set_message(f"Gaussian added at ({xc:.2f}, {A:.2f}).")
 
 
@@ -395,7 +390,7 @@ class AnalysisManager:
         qd = self.file_manager.get_active_qd()
         qd.composite_curve.curve_list.remove(curve)
         self.update_gauss_table()
-        self.graph_manager.update_plot()
+        self.graph_manager.remove_curve_line(curve)
         self.set_message("Gaussian deleted.")
 
 
@@ -416,19 +411,11 @@ def get_curve_param_list(qd: quant_data.QuantData) -> List[List[float]]:
     curve_param_list = [[peak, y0, area, xc, A, w], ...]
     """
     qd.composite_curve.sort()
-    curve_param_list = []
-    y0 = None
-    peak = 1
-
-    for curve in qd.composite_curve.curve_list:
-        area = curve.area()
-        params = curve.get_params()
+    xc, A, w, y0 = qd.composite_curve.pack_params()
+    areas = curves.gaussian_areas(A, w)
 
-        if len(params) == 1:
-            y0 = params[0]
-        else:
-            curve_info = [peak, y0, area] + list(params)
-            curve_param_list.append(curve_info)
-            peak += 1
+    columns = np.column_stack((areas, xc, A, w)).tolist()
+    curve_param_list = [[peak, float(y0)] + params
+                        for peak, params in enumerate(columns, start=1)]
 
-    return curve_param_list
\ No newline at end of file
+    return curve_param_list
@@ -6,11 +6,16 @@ Created on Tue Mar 12 17:02:56 2024
 @author: Justin
 """
 
+import math
+import operator
 import numpy as np
 from typing import Union, Optional, Tuple, List
-from numpy.typing import ArrayLike
+from numpy.typing import ArrayLike, NDArray
 from abc import ABC
 from abc import abstractmethod
+from src import _kernels
+
+_AREA_COEF = 2 * math.sqrt(math.pi/2) # Area of a gaussian is this * A * w.
 
 
 class Curve(ABC):
@@ -32,6 +37,14 @@ class Curve(ABC):
     def evaluate(self):
         ...
 
+    @abstractmethod
+    def get_bounds(self):
+        ...
+
+    @abstractmethod
+    def jacobian(self):
+        ...
+
 
 class Constant(Curve):
     """
@@ -42,6 +55,8 @@ class Constant(Curve):
         xc: Used for sorting, i.e., denotes that this is a baseline for
             CompositeCurve and HandleManager.
     """
+    _NPARAMS = 1 # Length of get_params()
+
     def __init__(self, constant: float):
         self.y = constant
         self.xc = -1
@@ -56,7 +71,7 @@ class Constant(Curve):
         Returns self.y in a singleton tuple, as the result must be iterable
         for the CompositeCurve's get_params method.
         """
-        return tuple([self.y])
+        return (self.y,)
 
 
 
@@ -66,10 +81,17 @@ class Constant(Curve):
 
 
 
+    def get_bounds(self) -> Tuple[Tuple[float], Tuple[float]]:
+        """ Returns (lower, upper) bounds on the params, for fitting. """
+        return (-np.inf,), (np.inf,)
+
+
+
     def evaluate(
             self,
             x: Optional[Union[ArrayLike, float]] = None,
-            *params: Tuple[float]) -> Optional[Union[ArrayLike, float]]:
+            *params: Tuple[float],
+            out: Optional[NDArray] = None) -> Optional[Union[ArrayLike, float]]:
         """
         If params are passed in (i.e., if they have been set by a fitting
         operation) it will use that value. If not, it will just take the value
@@ -78,10 +100,10 @@ class Constant(Curve):
         Args:
             x: The value(s) at which to evaluate the curve.
             *params: Passed in by CompositeCurve upon composite evaluation.
+            out: Optional array of same shape as x to write the result into.
 
         Returns:
-        x+0+y: Returns y, or an array of y of same length as x. x*0 is just to
-               show logic.
+        y: Returns y, or an array of y of same shape as x.
         """
         if x is None:
             return
@@ -91,7 +113,24 @@ class Constant(Curve):
         else:
             y = self.y
 
-        return x * 0 + y
+        if np.isscalar(x):
+            return y
+        if out is not None:
+            out.fill(y)
+            return out
+        return np.full(np.shape(x), y, dtype=float)
+
+
+
+    def jacobian(
+            self,
+            x: ArrayLike,
+            *params: Tuple[float]) -> NDArray[np.float64]:
+        """
+        Returns the jacobian at positions x, shape (len(x), 1). The curve
+        doesn't depend on x, so it's a column of ones.
+        """
+        return np.ones((np.size(x), 1))
 
 
 
@@ -112,6 +151,8 @@ class Gaussian(Curve):
         A: Amplitude of the gaussian (float).
         w: Width at half max of the gaussian (float).
     """
+    _NPARAMS = 3 # Length of get_params()
+
     def __init__(self, xc: float = 0, A: float = 1, w: float = 1):
         self.xc = abs(xc)
         self.A = abs(A)
@@ -132,26 +173,38 @@ class Gaussian(Curve):
 
     def set_params(self, xc:float = None, A:float = None, w:float = None) -> None:
         """
-        Sets params (center, amplitude, or width), makes them
-        positive values.
+        Sets params (center, amplitude, or width). Values are taken as they
+        are; callers are responsible for keeping them positive (the fitter
+        does so with bounds).
         """
         if xc is not None:
-            self.xc = abs(xc)
+            self.xc = xc
         if A is not None:
-            self.A = abs(A)
+            self.A = A
         if w is not None:
-            self.w = abs(w)
+            self.w = w
+
+
+
+    def get_bounds(self) -> Tuple[Tuple[float], Tuple[float]]:
+        """
+        Returns (lower, upper) bounds on the params, for fitting. Center,
+        amplitude and width are all non-negative.
+        """
+        return (0, 0, 0), (np.inf, np.inf, np.inf)
 
 
 
     def evaluate(
             self,
             x: Optional[Union[ArrayLike, float]] = None,
-            *params: Tuple[float]) -> Optional[Union[ArrayLike, float]]:
+            *params: Tuple[float],
+            out: Optional[NDArray] = None) -> Optional[Union[ArrayLike, float]]:
         """
         Returns height of gaussian curve at position(s) x.  If params are
         passed in, it will use those. Otherwise it will use pre-defined
-        attributes.
+        attributes. Scalar x (e.g. handle positions) skips NumPy entirely.
+        Array results are written into out, if given.
         """
         if x is None:
             return
@@ -166,14 +219,51 @@ class Gaussian(Curve):
             A = self.A
             w = self.w
 
-        return A*np.exp( -0.5*((x-xc)/w)**2 )
+        if np.isscalar(x):
+            return A*math.exp( -0.5*((x-xc)/w)**2 )
+
+        # Same formula, worked through one buffer with in-place ufuncs. The
+        # 1/2 in the exponent is folded into the scale, sqrt(0.5)/w.
+        x = np.asarray(x, dtype=float)
+        if out is None:
+            out = np.empty_like(x)
+        np.subtract(x, xc, out=out)
+        out *= math.sqrt(0.5) / w
+        out *= out
+        np.negative(out, out=out)
+        np.exp(out, out=out)
+        out *= A
+        return out if x.ndim else out[()]
+
+
+
+    def jacobian(
+            self,
+            x: ArrayLike,
+            *params: Tuple[float]) -> NDArray[np.float64]:
+        """
+        Returns the analytic jacobian at positions x, shape (len(x), 3), with
+        columns d/dxc, d/dA and d/dw. If params aren't passed in, uses the
+        current ones.
+        """
+        if params:
+            xc, A, w = params
+        else:
+            xc, A, w = self.xc, self.A, self.w
+
+        z = (np.asarray(x, dtype=float) - xc) / w
+        E = np.exp(-0.5*z*z)
+        J = np.empty((z.size, 3))
+        J[:, 0] = A*E*z/w
+        J[:, 1] = E
+        J[:, 2] = J[:, 0]*z
+        return J
 
 
 
     def area(self) -> float:
         """ Returns area under the gaussian. """
-        sqrtPIdiv2 = np.sqrt(np.pi/2)
-        return 2 * self.A * self.w * sqrtPIdiv2
+        return gaussian_areas(self.A, self.w)
 
 
 
@@ -185,9 +275,12 @@ class CompositeCurve(Curve):
 
     Attributes:
         curve_list: A list of Curve objects.
+        _scratch: Buffers for intermediate (len(x), n_gaussians) arrays of
+                  the jacobian, reallocated only when that shape changes.
     """
     def __init__(self):
         self.curve_list = []
+        self._scratch = None
 
     def clone(self) -> Curve:
         composite_curve = CompositeCurve()
@@ -195,6 +288,19 @@ class CompositeCurve(Curve):
             composite_curve.curve_list.append(curve.clone())
         return composite_curve
 
+    @classmethod
+    def from_params(cls, *params: float) -> 'CompositeCurve':
+        """
+        Builds a baseline followed by gaussians from params laid out the way
+        get_params returns them for such a curve, i.e. (y0, xc1, A1, w1, ...).
+        """
+        composite_curve = cls()
+        composite_curve.curve_list.append(Constant(params[0]))
+        for i in range(1, len(params), Gaussian._NPARAMS):
+            params_i = params[i:i+Gaussian._NPARAMS]
+            composite_curve.curve_list.append(Gaussian(*params_i))
+        return composite_curve
+
 
 
     def get_params(self) -> List[float]:
@@ -219,46 +325,230 @@ class CompositeCurve(Curve):
         """
         i = 0
         for curve in self.curve_list:
-            param_length = len(curve.get_params())
+            param_length = curve._NPARAMS
             curve.set_params(*params[i:i+param_length])
             i += param_length
 
 
 
+    def get_bounds(self) -> Tuple[List[float], List[float]]:
+        """
+        Returns (lower, upper) bounds on the params of all curves, in the same
+        order as get_params.
+        """
+        lower, upper = [], []
+        for curve in self.curve_list:
+            curve_lower, curve_upper = curve.get_bounds()
+            lower.extend(curve_lower)
+            upper.extend(curve_upper)
+        return lower, upper
+
+
+
     def evaluate(
             self,
             x: Optional[Union[ArrayLike, float]] = None,
-            *params: Tuple[float]) -> Optional[Union[ArrayLike, float]]:
+            *params: Tuple[float],
+            out: Optional[NDArray] = None) -> Optional[Union[ArrayLike, float]]:
         """
-        Returns height of the composite cuve at position(s) x. Goes through
-        and evaluates each curve in curve_list individually (either with new
-        params or existing ones) and sums the result.
+        Returns height of the composite cuve at position(s) x. The gaussians
+        are evaluated all at once from arrays of their params (either new
+        params or existing ones) and summed on top of the baseline. Array
+        results are written into out, if given.
         """
 
         if x is None:
             return
 
-        y = 0
-
         # If new parameters are present, evaluate the the curve with those.
         if params:
-            i = 0
-            for curve in self.curve_list:
-                param_length = len(curve.get_params())
-                y += curve.evaluate(x, *params[i:i+param_length])
-                i += param_length
+            return self._evaluate_with_params(x, *params, out=out)
 
         # Evaluate the curve with the current parameters.
+        xc, A, w, y0 = self.pack_params()
+        return self._evaluate_packed(x, xc, A, w, y0, out=out)
+
+
+
+    def _evaluate_with_params(
+            self,
+            x: Union[ArrayLike, float],
+            *params: Tuple[float],
+            out: Optional[NDArray] = None) -> Union[ArrayLike, float]:
+        """ Evaluates the curve with new params, into out if given. """
+        if not self._is_baseline_and_gaussians():
+            y = self._evaluate_each(x, *params)
+            if out is None:
+                return y
+            out[...] = y
+            return out
+        params = np.asarray(params, dtype=float)
+        y0 = params[0]
+        xc, A, w = params[1:].reshape(-1, 3).T
+        return self._evaluate_packed(x, xc, A, w, y0, out=out)
+
+
+
+    def _evaluate_packed(
+            self,
+            x: Union[ArrayLike, float],
+            xc: NDArray,
+            A: NDArray,
+            w: NDArray,
+            y0: float,
+            out: Optional[NDArray] = None) -> Union[ArrayLike, float]:
+        """
+        Evaluates gaussians (xc, A, w) on top of baseline y0, into out if
+        given. Uses the numba kernel if available. Otherwise each gaussian is
+        worked out in one temporary buffer with in-place ufuncs and added to
+        out.
+        """
+        x = np.asarray(x, dtype=float)
+        if out is None:
+            out = np.empty_like(x)
+        if _kernels.HAVE_NUMBA and x.ndim == 1:
+            return _kernels.eval_gaussians(x, xc, A, w, y0, out)
+
+        out.fill(y0)
+        tmp = np.empty_like(out)
+        scale = math.sqrt(0.5) / w
+        for i in range(len(xc)):
+            np.subtract(x, xc[i], out=tmp)
+            tmp *= scale[i]
+            tmp *= tmp
+            np.negative(tmp, out=tmp)
+            np.exp(tmp, out=tmp)
+            tmp *= A[i]
+            out += tmp
+        return out if x.ndim else out[()]
+
+
+
+    def jacobian(
+            self,
+            x: ArrayLike,
+            *params: Tuple[float]) -> NDArray[np.float64]:
+        """
+        Returns the analytic jacobian of the composite curve at positions x,
+        with shape (len(x), len(params)). Columns are in the same order as
+        get_params. If params aren't passed in, uses the current ones.
+        """
+        if not params:
+            params = self.get_params()
+        if not self._is_baseline_and_gaussians():
+            return self._jacobian_each(x, *params)
+
+        params = np.asarray(params, dtype=float)
+        xc, A, w = params[1:].reshape(-1, 3).T
+
+        # Intermediates go in scratch buffers reused between calls.
+        x = np.asarray(x, dtype=float)
+        shape = (x.size, xc.size)
+        if self._scratch is None or self._scratch[0].shape != shape:
+            self._scratch = (np.empty(shape), np.empty(shape))
+        z, E = self._scratch
+
+        np.subtract(x[:, None], xc, out=z)
+        z /= w
+        np.multiply(z, z, out=E)
+        E *= -0.5
+        np.exp(E, out=E)
+
+        J = np.empty((x.size, params.size))
+        J[:, 0] = 1
+        J[:, 2::3] = E
+        np.multiply(E, z, out=J[:, 1::3])
+        J[:, 1::3] *= A / w
+        np.multiply(J[:, 1::3], z, out=J[:, 3::3])
+        return J
+
+
+
+    def _jacobian_each(
+            self,
+            x: ArrayLike,
+            *params: Tuple[float]) -> NDArray[np.float64]:
+        """
+        Builds the jacobian curve by curve. Fallback for curve lists that
+        aren't a baseline followed by gaussians.
+        """
+        blocks = []
+        i = 0
+        for curve in self.curve_list:
+            param_length = curve._NPARAMS
+            blocks.append(curve.jacobian(x, *params[i:i+param_length]))
+            i += param_length
+        return np.hstack(blocks)
+
+
+
+    def _evaluate_each(
+            self,
+            x: Union[ArrayLike, float],
+            *params: Tuple[float]) -> Union[ArrayLike, float]:
+        """
+        Evaluates each curve in curve_list individually with new params and
+        sums the result. Fallback for curve lists that aren't a baseline
+        followed by gaussians. For array x, every curve is evaluated into the
+        same buffer and added to the total in place.
+        """
+        if np.isscalar(x):
+            y = 0
+            buffer = None
         else:
-            for curve in self.curve_list:
-                y += curve.evaluate(x)
+            y = np.zeros(np.shape(x))
+            buffer = np.empty_like(y)
 
+        i = 0
+        for curve in self.curve_list:
+            param_length = curve._NPARAMS
+            y += curve.evaluate(x, *params[i:i+param_length], out=buffer)
+            i += param_length
         return y
 
 
 
+    def pack_params(self) -> Tuple[NDArray, NDArray, NDArray, float]:
+        """
+        Gathers the params of all gaussians in curve_list into three arrays
+        (centers, amplitudes and widths), and sums the baselines into y0.
+        """
+        gaussians = [curve for curve in self.curve_list
+                     if isinstance(curve, Gaussian)]
+        n = len(gaussians)
+        xc = np.fromiter((curve.xc for curve in gaussians), float, count=n)
+        A = np.fromiter((curve.A for curve in gaussians), float, count=n)
+        w = np.fromiter((curve.w for curve in gaussians), float, count=n)
+        y0 = sum(curve.y for curve in self.curve_list
+                 if isinstance(curve, Constant))
+        return xc, A, w, y0
+
+
+
+    def _is_baseline_and_gaussians(self) -> bool:
+        """
+        Checks whether curve_list is a baseline followed by gaussians, i.e.,
+        whether a flat list of params can be reshaped into gaussian columns.
+        """
+        return (len(self.curve_list) > 0
+                and isinstance(self.curve_list[0], Constant)
+                and all(isinstance(curve, Gaussian)
+                        for curve in self.curve_list[1:]))
+
+
+
     def sort(self) -> None:
         """
         Sorts the list of curves, self.curve_list, based on their centers, xc.
         """
-        self.curve_list = sorted(self.curve_list, key=lambda curve: curve.xc)
+        self.curve_list.sort(key=operator.attrgetter('xc'))
+
+
+
+def gaussian_areas(
+        A: Union[ArrayLike, float],
+        w: Union[ArrayLike, float]) -> Union[NDArray, float]:
+    """
+    Returns the area(s) under gaussian(s) with amplitude(s) A and width(s) w.
+    """
+    return _AREA_COEF * A * w
@@ -7,9 +7,12 @@ Created on Mon Mar 18 14:37:50 2024
 """
 
 import tkinter as tk
-from typing import Optional
+from concurrent import futures
+from typing import Callable, List, Optional
 from src import quant_data
 
+IMPORT_POLL_INTERVAL = 10 # ms between checks on files being imported.
+
 class FileManager:
     """
     Keeps track of files and their quant data objects.
@@ -18,11 +21,14 @@ class FileManager:
         app: Main entry point into EasyQuant program.
         qd_list: List of all QuantData objects. Same indices as in listbox.
         active_index: index of the currently active QuantData object in list.
+        executor: Worker threads that read imported files, so reading them
+                  doesn't block the Tk mainloop.
     """
     def __init__(self, app):
         self.app = app
         self.qd_list = []
         self.active_index: Optional[int] = None
+        self.executor = futures.ThreadPoolExecutor(max_workers=4)
 
 
 
@@ -41,22 +47,38 @@ class FileManager:
 
 
 
-    def import_files(self) -> None:
+    def import_files(self, on_done: Optional[Callable] = None) -> None:
         """
         Uses tk module to get paths for user-selected files.
-        Registers each file name in the qd_list.
+        Reads the files in worker threads and returns immediately. Once all
+        are read, registers them in the qd_list in the order they were
+        selected, then calls on_done, if given.
         """
-        for filename in tk.filedialog.askopenfilenames():
-            self.register_file(filename)
+        pending = [self.executor.submit(quant_data.QuantData, filename)
+                   for filename in tk.filedialog.askopenfilenames()]
+        self.poll_imports(pending, on_done)
 
 
 
-    def register_file(self, filename: str) -> None:
+    def poll_imports(
+            self,
+            pending: List[futures.Future],
+            on_done: Optional[Callable] = None) -> None:
         """
-        Inits a quantdata object for a file and adds it to the qd_list.
+        Checks on files being read by import_files from the Tk mainloop, and
+        reschedules itself until all are done. Tk isn't thread-safe, so the
+        QuantData objects are only registered (and on_done called) from here.
         """
-        qd = quant_data.QuantData(filename)
-        self.qd_list.append(qd)
+        if not all(future.done() for future in pending):
+            self.app.after(IMPORT_POLL_INTERVAL, self.poll_imports, pending,
+                           on_done)
+            return
+
+        for future in pending:
+            self.qd_list.append(future.result())
+
+        if on_done is not None:
+            on_done()
 
 
 
@@ -9,10 +9,16 @@ This module contains functions used for fitting curves to data.
 """
 
 import numpy as np
-from numpy.typing import ArrayLike, NDArray
-from scipy import optimize, signal
+from numpy.typing import ArrayLike
+from scipy import ndimage, optimize, signal
 from src import curves
 
+# Savitzky-Golay smoothing coefficients used by estimate_fit.
+_SAVGOL_COEFFS = signal.savgol_coeffs(window_length=21, polyorder=4)
+
+# Full width at half max of a gaussian, in units of its standard deviation.
+_FWHM_PER_SIGMA = 2 * np.sqrt(2 * np.log(2))
+
 
 def optimize_fit(
         x: ArrayLike,
@@ -21,12 +27,31 @@ def optimize_fit(
     """
     Takes data, and a model with initial parameters and optimizes the fit.
     Returns the fitted curve. Works with any Curve type which has clone,
-    evaluate, get_params and set_params methods. x and y must have same length.
+    evaluate, jacobian, get_params, get_bounds and set_params methods. x and
+    y must have same length.
+
+    Uses a trust region reflective least squares solver with the analytic
+    jacobian of the curve, bounded by the curve's get_bounds. Raises
+    RuntimeError if it doesn't converge.
     """
-    popt, pcov = optimize.curve_fit(initial_curve.evaluate, x, y, p0=initial_curve.get_params())
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    def residuals(params):
+        return initial_curve.evaluate(x, *params) - y
+
+    def jacobian(params):
+        return initial_curve.jacobian(x, *params)
+
+    result = optimize.least_squares(residuals, initial_curve.get_params(),
+                                    jac=jacobian, method='trf',
+                                    bounds=initial_curve.get_bounds(),
+                                    x_scale='jac', ftol=1e-8, xtol=1e-8)
+    if not result.success:
+        raise RuntimeError(f"Optimal parameters not found: {result.message}")
 
     fitted_curve = initial_curve.clone()
-    fitted_curve.set_params(*popt)
+    fitted_curve.set_params(*result.x)
 
     return fitted_curve
 
@@ -34,87 +59,40 @@ def estimate_fit(x: ArrayLike,
                  y: ArrayLike) -> curves.CompositeCurve:
     """
     Estimates a CompositeCurve fit from data. Smoothes data with a Savitzky-
-    Golay filter, then uses derivatives to find peaks. Baseline is estimated
-    from y data, and a gaussian is assigned to each peak.
+    Golay filter, then finds peaks and their widths with scipy's find_peaks.
+    Baseline is estimated from y data, and a gaussian is assigned to each
+    peak.
 
     # TODO: Estimate noise and adjust the smoothing accordingly
     """
 
     # Smooth the data
-    y = signal.savgol_filter(y, window_length=21, polyorder=4)
+    y = ndimage.convolve1d(np.asarray(y, dtype=float), _SAVGOL_COEFFS,
+                           mode='mirror')
 
     h = (x[1]-x[0]) # X range as a tuple for some reason.
 
-    # Calculate the 1st and 2nd derivatives
-    dy = compute_numerical_derivative(y, h, 1)
-    ddy = compute_numerical_derivative(dy, h, 1)
-
     estimated_fit = curves.CompositeCurve()
 
     # Baseline estimate is the first point's y coordinate.
     estimated_fit.curve_list.append(curves.Constant(y[0]))
 
-    # Estimate peak locations, amplitudes and widths
-
-    # Find points where the first derivative crosses zero
-    zero_crossing_indices = find_zero_crossings(dy)
-
+    # Estimate peak locations, amplitudes and widths. Peaks must rise at
+    # least half the vertical range of the data above the baseline.
     vertical_range_of_data = (y.max()-y[0])
-    acceptable_peak_height = 0.5 * vertical_range_of_data
+    acceptable_peak_height = y[0] + 0.5 * vertical_range_of_data
 
-    for i in zero_crossing_indices:
-        # If the 2nd dervative is negative it could be a peak
-        if ddy[i] < 0:
-            w_est = np.sqrt(-y[i] / ddy[i])
-            peak_height = (y[i]-y[0])
+    peaks, properties = signal.find_peaks(y, height=acceptable_peak_height,
+                                          width=1)
 
-            if w_est < 3 and peak_height > acceptable_peak_height:
-                new_gaussian = curves.Gaussian(xc=x[i], A=y[i]-y[0], w=w_est)
-                estimated_fit.curve_list.append(new_gaussian)
+    # find_peaks measures full width at half max in samples; convert to the
+    # gaussian's standard deviation in x units. Screen out wide peaks.
+    w_estimates = properties['widths'] * h / _FWHM_PER_SIGMA
+    narrow = w_estimates < 3
+    peaks, w_estimates = peaks[narrow], w_estimates[narrow]
 
-    return estimated_fit
-
-def compute_numerical_derivative(
-        y: ArrayLike,
-        step_size: float = 1.0,
-        num_iterations: int = 1) -> NDArray[float]:
-    """
-    Compute the numerical derivative of a given array using the three-point
-    finite difference method.
-
-    Parameters:
-    - y (numpy.ndarray): The input array for which the derivative is
-        to be computed.
-    - step_size (float): The step size used in the finite difference method.
-        Default is 1.0.
-    - num_iterations (int): The number of iterations to apply the finite
-        difference method. Default is 1.
-
-    Returns:
-    - numpy.ndarray: The array containing the computed numerical derivative.
-    """
-    for iteration in range(num_iterations):
-        # Compute the three-point finite difference
-        derivative_values = (y[2:] - y[:-2]) / (2.0 * float(step_size))
-
-        # Pad values at the extremes to keep the size constant
-        derivative_values = np.concatenate(([derivative_values[0]], derivative_values, [derivative_values[-1]]))
-
-    return derivative_values
-
-
-def find_zero_crossings(y: ArrayLike) -> NDArray[float]:
-    """
-    Find zero-crossings in a given array.
-
-    Parameters:
-    - y (numpy.ndarray): The input array for which zero-crossings
-        are to be identified.
-
-    Returns:
-    - numpy.ndarray: An array containing the indices of zero-crossings in the
-        input array.
-    """
-    zero_crossings = np.where(np.diff(np.sign(y)))[0]
-    return zero_crossings
+    for i, w_est in zip(peaks, w_estimates):
+        new_gaussian = curves.Gaussian(xc=x[i], A=y[i]-y[0], w=w_est)
+        estimated_fit.curve_list.append(new_gaussian)
 
+    return estimated_fit
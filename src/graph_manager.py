@@ -8,8 +8,9 @@ Created on Wed Mar 13 21:17:25 2024
 """
 
 import collections
+import contextlib
 import numpy as np
-from typing import Optional, Deque, Dict
+from typing import Optional, Deque, Dict, List
 from numpy.typing import ArrayLike, NDArray
 import tkinter as tk
 
@@ -25,6 +26,9 @@ mpl.use('TkAgg')
 mpl.rc('font', size='11.0', weight='light',
        **{'family':'sans-serif', 'sans-serif':['Arial']})
 mpl.interactive(True)
+# Let Agg drop line vertices that are closer than a pixel to the path.
+mpl.rcParams['path.simplify'] = True
+mpl.rcParams['path.simplify_threshold'] = 1.0
 
 class GraphManager(tk.Frame):
     """
@@ -40,11 +44,22 @@ class GraphManager(tk.Frame):
         handle_manager: A subclass which deals with interactive handles.
         x: The x-axis points. Same bounds as raw data, but more points.
         curve_lines: Dict of {curve: (line, handle)}
+        handle_to_curve: Reverse lookup of curve_lines, {handle: curve}.
+        line_pool: List of hidden (line, handle) pairs from removed curves,
+                   reused by add_curve instead of plotting new ones.
         data_line: The mpl.Line object for the raw data.
         composite_curve_line: The mpl.Line object for the composite curve.
         graph_toolbar: A class that handles the toolbar under the graph.
-        history:
+        history: Deque of the composite curve's params (tuples, as returned
+                 by get_params), newest first.
         redo_undo_counter: An int that keeps track of the position in history.
+        background: Pixels of the axes from the last full draw, without the
+                    animated artists (curve lines and handles). Used to blit.
+        batch_depth: Number of nested batch_draw blocks currently open.
+        batch_draw_requested: Whether a draw was requested inside batch_draw.
+        pending_blit: Tk after_idle id of a scheduled blit, if any.
+        curves_modified: Whether curves were changed by hand (dragged, added
+                         or deleted) since history was last updated.
     """
     def __init__(self, analysis_window, analysis_manager):
         tk.Frame.__init__(self, analysis_window)
@@ -76,13 +91,21 @@ class GraphManager(tk.Frame):
         # Connect events to methods.
         self.fig.canvas.mpl_connect('key_press_event', self.on_key_press)
         self.fig.canvas.mpl_connect('key_release_event', self.on_key_release)
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
 
         self.x: Optional[NDArray] = None
         self.curve_lines: Dict = {}
+        self.handle_to_curve: Dict = {}
+        self.line_pool: List = []
         self.data_line: mpl.lines.Line2D = None
         self.composite_curve_line: mpl.lines.Line2D = None
         self.history: Optional[Deque] = None
         self.undo_redo_counter: int = 0
+        self.background = None
+        self.batch_depth: int = 0
+        self.batch_draw_requested: bool = False
+        self.pending_blit: Optional[str] = None
+        self.curves_modified: bool = False
 
         # Custom toolbar.
         self.graph_toolbar = graph_toolbar.GraphToolbar(self.canvas, self,
@@ -93,14 +116,21 @@ class GraphManager(tk.Frame):
         """
         Sets the graph up to plot a new curve. Does not modify the
         CompositeCurve of the QuantData object. Typically called when changing
-        files.
+        files. The axes aren't cleared: the data line and curve lines are kept
+        and given new data, so ticks and labels aren't rebuilt.
         """
         qd = self.analysis_manager.get_active_qd()
-        self.axes.clear()
-        self.curve_lines = {}
+        self.handle_manager.set_selected_handle(None)
         self.set_axes_labels()
         self.set_x_from_qd()
         self.axes.set_title(qd.name)
+
+        # The data line is part of the background, which needs a full draw.
+        if self.data_line is not None:
+            self.data_line.set_data(qd.x, qd.y)
+            self.background = None
+            self.fig.canvas.draw_idle()
+
         self.update_plot()
         self.init_history()
 
@@ -108,7 +138,7 @@ class GraphManager(tk.Frame):
         """ Updates the history and plot. """
         # Set the fitted curve into history
         qd = self.analysis_manager.get_active_qd()
-        self.history.appendleft(qd.composite_curve.clone())
+        self.history.appendleft(tuple(qd.composite_curve.get_params()))
 
         # Replot the data
         self.update_plot()
@@ -117,37 +147,109 @@ class GraphManager(tk.Frame):
 
     def update_plot(self) -> None:
         """
-        Removes all lines and plots them again. self.fig must be defined.
+        Plots the data, if not already plotted, and all curves. Existing
+        curve lines and handles are reused in order; spare ones are hidden in
+        self.line_pool, and missing ones are taken from the pool or plotted.
+        Only plotting the data or changing the axes limits needs a full draw;
+        otherwise curves are blitted. self.fig must be defined.
         """
-        for line in self.axes.lines:
-            line.remove()
-
         qd = self.analysis_manager.get_active_qd()
+
+        # Each curve is evaluated once; the composite is the sum of those.
+        curve_list = qd.composite_curve.curve_list
+        ys = [curve.evaluate(self.x) for curve in curve_list]
+        composite_y = np.add.reduce(ys)
+
+        # The limits cover the curves too (e.g. a default baseline far below
+        # the data), so every handle can be grabbed.
+        if self.set_axes_limits_from_qd([composite_y, *ys]):
+            self.background = None # Stale until the next full draw.
+
+        line_pairs = list(self.curve_lines.values())
         self.curve_lines = {}
+        self.handle_to_curve = {}
+        self.handle_manager.invalidate_handle_cache()
+        for curve, y, (line, handle) in zip(curve_list, ys, line_pairs):
+            line.set_data(self.x, y)
+            handle.set_data(*self.get_handle_position(curve))
+            self.curve_lines[curve] = (line, handle)
+            self.handle_to_curve[handle] = curve
+
+        for line_pair in line_pairs[len(curve_list):]:
+            self.hide_curve_line(line_pair)
+
+        for curve, y in zip(curve_list[len(line_pairs):],
+                            ys[len(line_pairs):]):
+            if curve is curve_list[0]:
+                self.add_curve(curve, y=y, color='green') # Baseline
+            else:
+                self.add_curve(curve, y=y)
+
+        # Composite curve
+        if self.composite_curve_line is None:
+            self.composite_curve_line = self.plot_curve(qd.composite_curve,
+                                                        y=composite_y,
+                                                        color='red', alpha=0.8)
+        else:
+            self.composite_curve_line.set_data(self.x, composite_y)
 
         # Data line
-        self.data_line = self.plot_data(qd.x, qd.y)
+        if self.data_line is None:
+            self.data_line = self.plot_data(qd.x, qd.y)
+            self.background = None # Stale until the next full draw.
+            self.fig.canvas.draw_idle()
+        else:
+            self.blit()
 
-        # Baseline
-        baseline_curve = qd.composite_curve.curve_list[0]
-        self.add_curve(baseline_curve, color='green')
 
-        # Individual curves and their handles
-        if len(qd.composite_curve.curve_list) > 1:
-            for curve in qd.composite_curve.curve_list[1:]:
-                self.add_curve(curve)
+    def hide_curve_line(self, line_pair: tuple) -> None:
+        """
+        Hides a (line, handle) pair that no longer has a curve and keeps it in
+        self.line_pool for reuse.
+        """
+        for artist in line_pair:
+            artist.set_visible(False)
+        self.line_pool.append(line_pair)
+        self.handle_manager.invalidate_handle_cache()
 
-        # Composite curve
-        self.composite_curve_line = self.plot_curve(qd.composite_curve,
-                                                    color='red', alpha=0.8)
 
-        self.fig.canvas.draw()
+    def set_axes_limits_from_qd(
+            self,
+            curve_ys: List[NDArray],
+            margin: float = 0.05) -> bool:
+        """
+        Fixes the axes limits to the bounds of the raw data and of the curve
+        values in curve_ys, padded by 'margin' (a fraction of the range) like
+        matplotlib's autoscaling. Autoscaling is turned off, so dragging
+        curves never changes the limits, and blitting them stays valid.
+        Returns whether the limits changed.
+        """
+        qd = self.analysis_manager.get_active_qd()
+        xmin, xmax = float(qd.x[0]), float(qd.x[-1])
+        ymin, ymax = float(qd.y.min()), float(qd.y.max())
+        for y in curve_ys:
+            ymin = min(ymin, float(y.min()))
+            ymax = max(ymax, float(y.max()))
+        x_pad = margin * (xmax - xmin)
+        y_pad = margin * (ymax - ymin)
+        xlim = (xmin - x_pad, xmax + x_pad)
+        ylim = (ymin - y_pad, ymax + y_pad)
+        if self.axes.get_xlim() == xlim and self.axes.get_ylim() == ylim:
+            return False
+
+        self.axes.set_autoscale_on(False)
+        self.axes.set_xlim(*xlim)
+        self.axes.set_ylim(*ylim)
+        return True
 
 
     def set_axes_labels(self, xlabel:str="Distance (cm)",
                         ylabel:str="Gray value") -> None:
-        self.axes.set_ylabel(ylabel)
-        self.axes.set_xlabel(xlabel)
+        """ Sets the axes labels, if they aren't already set to these. """
+        if self.axes.get_ylabel() != ylabel:
+            self.axes.set_ylabel(ylabel)
+        if self.axes.get_xlabel() != xlabel:
+            self.axes.set_xlabel(xlabel)
 
 
     def plot_data(self,
@@ -156,43 +258,101 @@ class GraphManager(tk.Frame):
         """
         Plots data curves (i.e., not fitted curves). self.axes must be defined.
         Returns the line object to be able to refer to the line that was drawn.
+        Antialiasing is off, which is cheaper for Agg and hardly visible on a
+        dense 1.5 px line.
         """
-        pid, = self.axes.plot(x, y, linestyle='-', linewidth=1.5, color='k')
+        pid, = self.axes.plot(x, y, linestyle='-', linewidth=1.5, color='k',
+                              antialiased=False)
         return pid
 
 
 
-    def add_curve(self, curve: curves.Curve, **options) -> None:
+    def add_curve(
+            self,
+            curve: curves.Curve,
+            y: Optional[NDArray] = None,
+            **options) -> None:
         """
         Plots a gaussian and its handle and adds it to the self.curve_lines
-        dict. Passes **options to the line, not the handle. Curve needs to have
+        dict. Passes y and **options to the line, not the handle. Reuses a
+        hidden pair from self.line_pool if there is one. Curve needs to have
         an evaluate method.
         """
-        line = self.plot_curve(curve, **options)
-        handle = self.plot_handle(curve)
+        if self.line_pool:
+            line, handle = self.line_pool.pop()
+            if y is None:
+                y = curve.evaluate(self.x)
+            line.set_data(self.x, y)
+            line.set(visible=True, **options)
+            handle.set_data(*self.get_handle_position(curve))
+            handle.set_visible(True)
+            self.mark_handle_as_deselected(handle, draw=False)
+        else:
+            line = self.plot_curve(curve, y, **options)
+            handle = self.plot_handle(curve)
         self.curve_lines[curve] = (line, handle)
+        self.handle_to_curve[handle] = curve
+        self.handle_manager.invalidate_handle_cache()
+
+
+
+    def add_curve_line(self, curve: curves.Curve) -> None:
+        """
+        Plots a curve that was just added to the composite curve, and updates
+        the composite curve line. Blits instead of redrawing the whole canvas.
+        """
+        self.add_curve(curve)
+        self.curves_modified = True
+        self.update_composite_curve_line(draw=False)
+        self.blit()
+
+
+
+    def remove_curve_line(self, curve: curves.Curve) -> None:
+        """
+        Hides the line and handle of a curve that was just removed from the
+        composite curve, and updates the composite curve line. Blits instead
+        of redrawing the whole canvas.
+        """
+        line_pair = self.curve_lines.pop(curve)
+        del self.handle_to_curve[line_pair[1]]
+        self.hide_curve_line(line_pair)
+        self.curves_modified = True
+        self.update_composite_curve_line(draw=False)
+        self.blit()
 
 
 
     def plot_handle(self, curve: curves.Curve) -> mpl.lines.Line2D:
         """
         Determines the midpoint of the gaussian, or, if it's a baseline, the
-        plot. Plots the handle in self.axes and returns the handle (Line2D)
+        plot. Plots the handle in self.axes and returns the handle (Line2D).
+        Like curve lines, handles don't affect the axes limits.
         """
-        xc = self.get_curve_midpoint(curve)
-        handle, = self.axes.plot(xc, curve.evaluate(xc), 'o', ms=10,
-                                 alpha=0.4, color='yellow')
+        handle, = self.axes.plot(*self.get_handle_position(curve), 'o', ms=10,
+                                 alpha=0.4, color='yellow', animated=True,
+                                 scalex=False, scaley=False)
         return handle
 
 
 
-    def plot_curve(self, curve: curves.Curve, **options) -> mpl.lines.Line2D:
+    def plot_curve(
+            self,
+            curve: curves.Curve,
+            y: Optional[NDArray] = None,
+            **options) -> mpl.lines.Line2D:
         """
-        Plots a curve in self.axes using its evaluate() method. **options are
-        forwarded to the mpl.axes.plot() method.
+        Plots a curve in self.axes using its evaluate() method, unless its
+        values at self.x are already passed in as y. **options are forwarded
+        to the mpl.axes.plot() method. Curve lines are animated, i.e. they
+        are drawn on top of the background by self.on_draw and self.blit.
+        They never rescale the axes, whose limits are set from the data.
         """
-        line, = self.axes.plot(self.x, curve.evaluate(self.x), linestyle='-',
-                               linewidth=1.5, **options)
+        if y is None:
+            y = curve.evaluate(self.x)
+        line, = self.axes.plot(self.x, y, linestyle='-',
+                               linewidth=1.5, animated=True,
+                               scalex=False, scaley=False, **options)
         return line
 
 
@@ -211,6 +371,16 @@ class GraphManager(tk.Frame):
 
 
 
+    def get_handle_position(self, curve: curves.Curve) -> tuple[NDArray]:
+        """
+        Returns the position of a curve's handle as ([x], [y]). Line2D data
+        has to be sequences, even for a single point.
+        """
+        xc = self.get_curve_midpoint(curve)
+        return np.atleast_1d(xc), np.atleast_1d(curve.evaluate(xc))
+
+
+
     def update_line(self, curve: curves.Curve, draw: bool = True) -> None:
         """
         Takes a Curve object, checks the self.curve_lines dict for its
@@ -220,8 +390,18 @@ class GraphManager(tk.Frame):
         """
         line = self.curve_lines[curve][0]
         line.set_data(self.x, curve.evaluate(self.x))
+        self.curves_modified = True
         if draw:
-            self.fig.canvas.draw()
+            self._request_redraw()
+
+    def update_all_lines(self, draw: bool = True) -> None:
+        """
+        Updates the lines of all curves in self.curve_lines, then draws to the
+        canvas once if 'draw' is True.
+        """
+        with self.batch_draw():
+            for curve in self.curve_lines:
+                self.update_line(curve, draw=draw)
 
     def update_handle(self, curve: curves.Curve, draw: bool = True) -> None:
         """
@@ -232,11 +412,12 @@ class GraphManager(tk.Frame):
         draw to the canvas. Reducing unecessary drawing improves interactive
         response time.
         """
-        xc = self.get_curve_midpoint(curve)
         handle = self.curve_lines[curve][1]
-        handle.set_data(xc, curve.evaluate(xc))
+        handle.set_data(*self.get_handle_position(curve))
+        self.handle_manager.invalidate_handle_cache()
+        self.curves_modified = True
         if draw:
-            self.fig.canvas.draw()
+            self._request_redraw()
 
     def update_composite_curve_line(self, draw: bool = True) -> None:
         """
@@ -248,22 +429,86 @@ class GraphManager(tk.Frame):
         qd = self.analysis_manager.get_active_qd()
         y = qd.composite_curve.evaluate(self.x)
         self.composite_curve_line.set_data(self.x, y)
+        self.curves_modified = True
         if draw:
-            self.fig.canvas.draw()
+            self._request_redraw()
+
+    def _request_redraw(self) -> None:
+        """
+        Schedules a blit of the curves for the next time Tk is idle. Requests
+        made before then are coalesced, so several updates in one event cost
+        a single blit. Inside a batch_draw block, the request is deferred to
+        the end of the block.
+        """
+        if self.batch_depth > 0:
+            self.batch_draw_requested = True
+        elif self.pending_blit is None:
+            self.pending_blit = self.after_idle(self._blit_pending)
+
+    def _blit_pending(self) -> None:
+        """ Runs the blit scheduled by _request_redraw. """
+        self.pending_blit = None
+        self.blit()
+
+    @contextlib.contextmanager
+    def batch_draw(self):
+        """
+        Context manager that suppresses draws inside its block. If any draw
+        was requested in the block, requests a single one at the end. Blocks
+        can be nested.
+        """
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
 
-    def mark_handle_as_selected(self, handle: mpl.lines.Line2D) -> None:
+        if self.batch_depth == 0 and self.batch_draw_requested:
+            self.batch_draw_requested = False
+            self._request_redraw()
+
+    def blit(self) -> None:
+        """
+        Restores the background cached by the last full draw and draws only
+        the animated artists on top of it. Much cheaper than a full draw, but
+        anything that changes the background (e.g. the data line or the axes)
+        needs a full draw instead. Without a valid background, requests one.
+        """
+        if self.background is None:
+            self.fig.canvas.draw_idle()
+            return
+
+        self.canvas.restore_region(self.background)
+        self.draw_animated_artists(self.canvas.get_renderer())
+        self.canvas.blit(self.axes.bbox)
+
+    def draw_animated_artists(self, renderer) -> None:
+        """ Draws the animated artists (curve lines and handles) in z-order. """
+        animated = [line for line in self.axes.lines if line.get_animated()]
+        for line in sorted(animated, key=lambda line: line.get_zorder()):
+            line.draw(renderer)
+
+    def mark_handle_as_selected(self, handle: mpl.lines.Line2D,
+                                draw: bool = True) -> None:
         """
         handle (mpl.lines.Line2D): The handle to be recolored.
+        draw: Whether to redraw. Handles are animated, so this is a blit.
         Returns: None
         """
         handle.set_color("blue")
+        if draw:
+            self._request_redraw()
 
-    def mark_handle_as_deselected(self, handle: mpl.lines.Line2D) -> None:
+    def mark_handle_as_deselected(self, handle: mpl.lines.Line2D,
+                                  draw: bool = True) -> None:
         """
         handle (mpl.lines.Line2D): The handle to be recolored.
+        draw: Whether to redraw. Handles are animated, so this is a blit.
         Returns: None
         """
         handle.set_color("yellow")
+        if draw:
+            self._request_redraw()
 
 
 # EVENTS
@@ -303,11 +548,33 @@ class GraphManager(tk.Frame):
 
 
 
+    def on_draw(self, event: mpl.backend_bases.DrawEvent) -> None:
+        """
+        A full draw skips animated artists. Caches the freshly drawn
+        background for blitting, then draws the animated artists on top.
+        Draws made by savefig already include the animated artists, and
+        aren't what is shown on the canvas, so they are ignored.
+        """
+        if self.canvas.is_saving():
+            return
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.draw_animated_artists(event.renderer)
+
+
+
     def on_key_release(self, event: mpl.backend_bases.KeyEvent) -> None:
-        """ Updates history if the composite curve changed. """
+        """
+        Updates history if the composite curve changed. Most key releases
+        follow no change to the curves, and return early.
+        """
+        if not self.curves_modified:
+            return
+        self.curves_modified = False
+
         qd = self.analysis_manager.get_active_qd()
-        if qd.composite_curve.get_params() != self.history[0].get_params():
-            self.history.appendleft(qd.composite_curve.clone())
+        params = tuple(qd.composite_curve.get_params())
+        if params != self.history[0]:
+            self.history.appendleft(params)
             self.analysis_manager.set_message("Gaussian moved manually.")
             self.analysis_manager.update_gauss_table()
 
@@ -319,21 +586,23 @@ class GraphManager(tk.Frame):
         Initializes the history manager, self.history
         """
         qd = self.analysis_manager.get_active_qd()
-        self.history = collections.deque([qd.composite_curve.clone()], 15)
+        params = tuple(qd.composite_curve.get_params())
+        self.history = collections.deque([params], 15)
+        self.curves_modified = False
         self.redo_undo_counter = 0
 
 
     def undo(self) -> None:
         """
-        Takes the CompositeCurve from the hisotry deque's -1 position and sets
-        a clone of that as the QuantData's current one. If it were to set the
-        actual object from the history, any modification would propagate, and
-        we don't want to rewrite history do we?
+        Takes the params from the hisotry deque's -1 position and sets a
+        CompositeCurve built from them as the QuantData's current one. History
+        only holds params, so modifying the curve can't rewrite history.
         """
         if self.history[-1] and self.redo_undo_counter > -len(self.history)+1:
             qd = self.analysis_manager.get_active_qd()
             self.history.rotate(-1)
-            qd.composite_curve = self.history[0].clone()
+            qd.composite_curve = curves.CompositeCurve.from_params(
+                *self.history[0])
             self.redo_undo_counter -= 1
 
             self.update_plot()
@@ -343,13 +612,14 @@ class GraphManager(tk.Frame):
 
     def redo(self) -> None:
         """
-        Takes the CompositeCurve from the hisotry deque's +1 position and sets
-        a clone of that as the QuantData's current one.
+        Takes the params from the hisotry deque's +1 position and sets a
+        CompositeCurve built from them as the QuantData's current one.
         """
         if self.history[1] and self.redo_undo_counter < 0:
             qd = self.analysis_manager.get_active_qd()
             self.history.rotate(1)
-            qd.composite_curve = self.history[0].clone()
+            qd.composite_curve = curves.CompositeCurve.from_params(
+                *self.history[0])
             self.redo_undo_counter += 1
 
             self.update_plot()
@@ -358,14 +628,26 @@ class GraphManager(tk.Frame):
 
 # INBOUND COMMUNICATION
 
-    def set_x_from_qd(self, n_steps: int = 1000) -> None:
+    def set_x_from_qd(self, n_steps: Optional[int] = None) -> None:
         """
         Generates a range of x values with bounds pulled from the QuantData
-        object's x values (raw data). Sets the new array as self.x.
+        object's x values (raw data). Sets the new array as self.x. By default
+        there is one point per pixel of figure width, as more can't be seen,
+        and the range is kept on the QuantData object for when the file is
+        shown again. Files with the same range (e.g. from the same instrument)
+        share one array, which is never modified in place.
         """
         qd = self.analysis_manager.get_active_qd()
-        xmin, xmax = qd.x[0], qd.x[-1]
-        self.x = np.linspace(xmin, xmax, n_steps)
+        if n_steps is None and qd.plot_x is not None:
+            self.x = qd.plot_x
+        else:
+            if n_steps is None:
+                n_steps = int(self.fig.bbox.width) or 700
+            xmin, xmax = qd.x[0], qd.x[-1]
+            if (self.x is None or len(self.x) != n_steps
+                    or self.x[0] != xmin or self.x[-1] != xmax):
+                self.x = np.linspace(xmin, xmax, n_steps)
+            qd.plot_x = self.x
 
 # HELPERS
 
@@ -14,6 +14,9 @@ from typing import Callable, Dict
 from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
 from src import tool_tip
 
+# Directory of the icon images, next to the script that was run.
+_IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), 'Images')
+
 
 class GraphToolbar(NavigationToolbar2Tk):
     """
@@ -24,19 +27,21 @@ class GraphToolbar(NavigationToolbar2Tk):
         graph_manager: The graph (tk.Frame) that these tools go underneath.
         analysis_manager: The overall controller for analysis operations.
         buttons: A dict containing buttons. {name: tk.Button}
-        img_dir: The directory path (str) where the image files are located.
+        gauss_width_images: The icons of the "Fix widths" button, loaded once.
+                            {'locked': tk.PhotoImage, 'unlocked': ...}
     """
     def __init__(self, canvas, frame, analysis_manager):
         self.graph_manager = frame
         self.analysis_manager = analysis_manager
-        self.img_dir = os.path.join(
-            os.path.abspath(sys.argv[0]).replace(sys.argv[0], ""), 'Images')
 
         # Overwrite default tools. See https://stackoverflow.com/a/23179396
         self.toolitems = ()
         NavigationToolbar2Tk.__init__(self, canvas, frame)
 
         self.buttons: Dict[str, tk.Button] = {}
+        self.gauss_width_images: Dict[str, tk.PhotoImage] = {
+            'locked': self.filename_to_image("gauss_locked.png"),
+            'unlocked': self.filename_to_image("gauss_unlocked.png")}
 
         # Same order in which buttons will appear, left to right.
         buttons_to_add=[
@@ -71,7 +76,7 @@ class GraphToolbar(NavigationToolbar2Tk):
         directory. Filename must contain extension (e.g, 'next.gif' or
         'save.png').
         """
-        img_path = os.path.join(self.img_dir, filename)
+        img_path = os.path.join(_IMG_DIR, filename)
         img = tk.PhotoImage(master=self, file=img_path)
         return img
 
@@ -104,10 +109,9 @@ class GraphToolbar(NavigationToolbar2Tk):
         and updates the image on the toolbar to match.
         """
         if self.analysis_manager.gauss_widths_locked():
-            img = self.filename_to_image("gauss_unlocked.png")
+            img = self.gauss_width_images['unlocked']
         else:
-            img = self.filename_to_image("gauss_locked.png")
+            img = self.gauss_width_images['locked']
         self.buttons["Fix widths"].config(image=img)
-        self.buttons["Fix widths"].image = img # Mem. alloc. trick
 
         self.analysis_manager.fix_gauss_widths()
\ No newline at end of file
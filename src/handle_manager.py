@@ -12,6 +12,9 @@ from typing import Optional
 import matplotlib as mpl
 from matplotlib import backend_bases
 from src import curves
+from src import _kernels
+
+MOTION_INTERVAL = 16 # ms between handle moves while dragging (~60 per s).
 
 class HandleManager:
     def __init__(self, graph_manager, analysis_manager):
@@ -22,48 +25,92 @@ class HandleManager:
         graph_manager: a GraphManager object that the handles are located in.
         analysis_manager: The controller for the analysis.
         epsilon: Pick tolerance in pixels
+        epsilon_sq: epsilon squared, for comparing with squared distances.
         selected_handle: mpl Line2D object whose center is the picking target.
         selected_curve: the curve corresponding to the selected handle.
-        clickpoint: the position of the click
+        clickpoint: the position of the click. The same array is reused for
+            every click.
+        motion_xy: the position of the mouse while dragging. The same array is
+            rewritten on every motion event, so receivers must not keep it.
+        motion_key: the key held down during the latest motion event.
+        pending_motion: Tk after id of a scheduled move_selected_handle, or
+            None.
+        transform: The axes' data to pixel transform. It is a live transform,
+                   so it stays valid when the axes limits or size change.
+        handle_cache: (handles, coordinates) from get_handle_coordinates, or
+                      None if handles were changed since. See
+                      invalidate_handle_cache.
         """
         self.graph_manager = graph_manager
         self.analysis_manager = analysis_manager
 
         self.epsilon: int = 7
+        self.epsilon_sq: int = self.epsilon * self.epsilon
         self.selected_handle: mpl.lines.Line2D = None
         self.selected_curve: curves.Curve = None
-        self.clickpoint: NDArray = None
+        self.clickpoint: NDArray = np.empty(2)
+        self.motion_xy: NDArray = np.empty(2)
+        self.motion_key: Optional[str] = None
+        self.pending_motion: Optional[str] = None
+        self.transform = graph_manager.axes.transData
+        self.handle_cache: Optional[tuple] = None
 
     def delete_gaussian(self, event: mpl.backend_bases.KeyEvent) -> None:
         if self.selected_curve is not None:
             # Do not remove baselines, which only have one parameter.
             if len(self.selected_curve.get_params()) != 1:
                 self.analysis_manager.delete_gaussian(self.selected_curve)
-                self.analysis_manager.update()
+                # The handle was removed along with its curve.
+                self.selected_handle = None
+                self.selected_curve = None
 
 
     def on_motion(self, event: backend_bases.KeyEvent) -> None:
         """
-        Updates the fit when the handle is moved. If shift is held down, when
-        moving the handle, it updates the height and width rather than the
-        height and position.
+        Records where the selected handle is dragged to, and schedules moving
+        it there. Motion events can come in faster than the graph redraws, so
+        they are coalesced: only the latest position is used, at most once per
+        MOTION_INTERVAL.
         """
         if self.selected_handle is None or event.inaxes is None or event.button != 1:
             return
 
-        key = event.key
-        current_xy = np.array([event.xdata, event.ydata])
-        curve = self.find_curve_by_handle(self.selected_handle)
+        self.motion_xy[0], self.motion_xy[1] = event.xdata, event.ydata
+        self.motion_key = event.key
+
+        if self.pending_motion is None:
+            self.pending_motion = self.graph_manager.after(
+                MOTION_INTERVAL, self.move_selected_handle)
+
+
+    def move_selected_handle(self) -> None:
+        """
+        Updates the fit to the latest position recorded by on_motion. If shift
+        is held down, when moving the handle, it updates the height and width
+        rather than the height and position.
+        """
+        self.pending_motion = None
 
+        # Set with the handle, so it can't change during a drag.
+        curve = self.selected_curve
         if curve is None:
-            self.graph_manager.set_message("Error: No curve associated with "
-                                           "the selected handle.")
             return
 
-        if key == 'shift':
-            self.analysis_manager.handle_moved_shift(curve, current_xy, self.clickpoint)
+        if self.motion_key == 'shift':
+            self.analysis_manager.handle_moved_shift(curve, self.motion_xy,
+                                                     self.clickpoint)
         else:
-            self.analysis_manager.handle_moved(curve, current_xy)
+            self.analysis_manager.handle_moved(curve, self.motion_xy)
+
+
+    def flush_pending_motion(self) -> None:
+        """
+        Carries out a scheduled move of the selected handle immediately, if
+        any, so the last position of a drag is never dropped.
+        """
+        if self.pending_motion is not None:
+            self.graph_manager.after_cancel(self.pending_motion)
+            self.move_selected_handle()
 
 
     def on_button_press(self, event: mpl.backend_bases.KeyEvent) -> None:
@@ -78,7 +125,9 @@ class HandleManager:
             self.analysis_manager.add_gaussian(xc=event.xdata, A=event.ydata)
             return
 
-        self.clickpoint = np.array([event.xdata, event.ydata])
+        # Outside the axes, xdata and ydata are None.
+        self.clickpoint[0] = np.nan if event.xdata is None else event.xdata
+        self.clickpoint[1] = np.nan if event.ydata is None else event.ydata
 
         # Left click selects a handle.
         selected_handle = self.hit_test_handles(event)
@@ -86,14 +135,16 @@ class HandleManager:
         if self.selected_handle is None:
             return
 
-        self.selected_curve = self.find_curve_by_handle(self.selected_handle)
         if self.selected_curve is None:
             self.graph_manager.set_message("Error: No curve associated with "
                                            "the selected handle.")
 
 
     def on_button_release(self, event: mpl.backend_bases.KeyEvent) -> None:
-        """ passthrough function """
+        """
+        Finishes any move still pending from dragging, then passes through.
+        """
+        self.flush_pending_motion()
         self.graph_manager.on_key_release(event)
 
 
@@ -113,26 +164,33 @@ class HandleManager:
 
     def _select_handle(self, handle: mpl.lines.Line2D) -> None:
         """
-        Selects the specified handle.
+        Selects the specified handle, and its curve. Recolors the previously
+        selected handle, if any, and the new one, then redraws once. Nothing
+        is redrawn if the handle was already selected.
         """
+        if handle is self.selected_handle:
+            self.selected_curve = self.find_curve_by_handle(handle)
+            return
+
         if self.selected_handle is not None:
-            self.graph_manager.mark_handle_as_deselected(self.selected_handle)
+            self.graph_manager.mark_handle_as_deselected(self.selected_handle,
+                                                         draw=False)
 
         self.selected_handle = handle
+        self.selected_curve = self.find_curve_by_handle(handle)
         self.graph_manager.mark_handle_as_selected(self.selected_handle)
-        self.graph_manager.fig.canvas.draw()
 
 
 
     def _deselect_current_handle(self) -> None:
         """
-        Deselects the currently selected handle, if any.
+        Deselects the currently selected handle, if any, and its curve.
         """
         if self.selected_handle is not None:
             self.graph_manager.mark_handle_as_deselected(self.selected_handle)
-            self.graph_manager.fig.canvas.draw()
 
         self.selected_handle = None
+        self.selected_curve = None
 
 
     def hit_test_handles(
@@ -141,68 +199,70 @@ class HandleManager:
         """
         Return closest handle within tolerance, otherwise None.
         """
-        # The coordinates of the mouse click in pixels
-        x, y = event.x, event.y
-
-        handles = self.get_handles_with_valid_coordinates()
+        handles, coordinates = self.get_handle_coordinates()
         if not handles:
             return None
 
-        distances = self.calculate_distances_to_handles(handles, x, y)
-        selected = self.find_closest_handle(handles, distances)
+        # All handles are transformed into pixels in one call, and compared
+        # to the coordinates of the mouse click (also in pixels). Squared
+        # distances order the same as distances, without the square roots.
+        pixels = self.transform.transform(coordinates)
+        if _kernels.HAVE_NUMBA:
+            index = _kernels.closest_within(pixels, event.x, event.y,
+                                            self.epsilon_sq)
+            return handles[index] if index >= 0 else None
+
+        pixels -= (event.x, event.y)
+        pixels *= pixels
+        squared_distances = pixels.sum(axis=1)
+
+        selected = self.find_closest_handle(handles, squared_distances)
         return selected
 
-    def get_handles_with_valid_coordinates(self) -> list[mpl.lines.Line2D]:
+    def get_handle_coordinates(
+            self) -> tuple[list[mpl.lines.Line2D], NDArray]:
         """
-        The second element of each curve_line value is the handle.
+        Returns the handles (the second element of each curve_line value) and
+        their data coordinates as an (N, 2) array, in the same order. These
+        are cached until invalidate_handle_cache is called.
         """
-        handles = [handle for _, handle in self.graph_manager.curve_lines.values()]
-        return handles
+        if self.handle_cache is not None:
+            return self.handle_cache
+
+        curve_lines = self.graph_manager.curve_lines
+        handles = []
+        coordinates = np.empty((len(curve_lines), 2))
+        for i, (_, handle) in enumerate(curve_lines.values()):
+            handles.append(handle)
+            coordinates[i] = handle.get_xdata()[0], handle.get_ydata()[0]
+        self.handle_cache = (handles, coordinates)
+        return self.handle_cache
+
+    def invalidate_handle_cache(self) -> None:
+        """
+        Marks the cached handle coordinates as stale. GraphManager calls this
+        whenever handles are added, removed or moved.
+        """
+        self.handle_cache = None
 
     def find_curve_by_handle(
             self,
             handle: mpl.lines.Line2D) -> Optional[curves.Curve]:
         """Reverse lookup to find the curve associated with a given handle."""
-        for curve, (line, hdl) in self.graph_manager.curve_lines.items():
-            if hdl == handle:
-                return curve
-        return None
-
-    def calculate_distances_to_handles(
-            self,
-            handles: list[mpl.lines.Line2D],
-            x: int,
-            y: int) -> NDArray:
-        """
-        x and y are the query coordinates in pixels.
-        """
-        distances = np.zeros(len(handles))
-        for i, handle in enumerate(handles):
-            gx, gy = self.get_display_coordinates(handle)
-            distances[i] = np.hypot(x - gx, y - gy)
-        return distances
-
+        return self.graph_manager.handle_to_curve.get(handle)
 
     def find_closest_handle(
             self,
             handles: list[mpl.lines.Line2D],
-            distances: NDArray) -> mpl.lines.Line2D:
+            squared_distances: NDArray) -> mpl.lines.Line2D:
         """
-        handles is a list of handle objects and distances is a list of the
-        calculated distances to the corresponding handles, in pixels.
+        handles is a list of handle objects and squared_distances is a list of
+        the calculated squared distances to the corresponding handles, in
+        pixels squared.
         """
-        min_distance_index = np.argmin(distances)
-        if distances[min_distance_index] > self.epsilon:
+        min_distance_index = squared_distances.argmin()
+        if squared_distances[min_distance_index] > self.epsilon_sq:
             selected_handle = None
         else:
             selected_handle = handles[min_distance_index]
         return selected_handle
-
-
-    def get_display_coordinates(self, handle: mpl.lines.Line2D) -> NDArray:
-        """
-        Gets the handle coordinates and transforms them into pixel values.
-        """
-        gx = handle.get_xdata()[0]
-        gy = handle.get_ydata()[0]
-        return self.graph_manager.fig.gca().transData.transform((gx, gy))
\ No newline at end of file
@@ -14,15 +14,20 @@ class MessageBar(tk.Text):
         tk.Text.__init__(self, container, height=1)
 
         default_message = "Welcome to EasyQuant!"
+        self.last_message = None # The message currently shown.
 
         self.configure(state=tk.DISABLED)
         self.set_message(default_message)
 
     def set_message(self, message_text: str):
         '''
-        Adds a message to the text box
+        Adds a message to the text box, unless it's already showing.
         '''
+        if message_text == self.last_message:
+            return
+
         self['state'] = 'normal'
         self.delete(1.0, 'end')
         self.insert("1.end", message_text)
-        self['state'] = 'disabled'
\ No newline at end of file
+        self['state'] = 'disabled'
+        self.last_message = message_text
\ No newline at end of file
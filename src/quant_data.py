@@ -9,9 +9,15 @@ Created on Wed Mar 13 21:07:37 2024
 import os
 import csv
 import numpy as np
+from typing import Optional
 from numpy.typing import NDArray
 from src import curves
 
+# Delimiter, quote character and header detected by read_csv, keyed by
+# (extension, first line). Files exported by the same tool usually share their
+# first (header) line, so only the first of them needs sniffing.
+_dialect_cache: dict[tuple[str, bytes], tuple[str, str, bool]] = {}
+
 class QuantData():
     """
     A QuantData object contains information such as the file path and
@@ -24,7 +30,17 @@ class QuantData():
         x: The list of x values from the file as an np.ndarray
         y: same as x but for y values.
         composite_curve: The Curve object that will hold the fits to the data.
+        plot_x: The x values that curves are plotted at. Set by GraphManager
+            the first time the file is shown, then reused.
+
+    USE_FLOAT32: If True, x and y are stored as float32, halving their memory.
+        Off by default: fitting converts them back to float64 on every call,
+        so it only pays off when many large files are open at once.
     """
+    __slots__ = ('path', 'base', 'name', 'x', 'y', 'composite_curve',
+                 'plot_x')
+
+    USE_FLOAT32 = False
 
     def __init__(self, path):
         self.path = path
@@ -32,29 +48,56 @@ class QuantData():
         self.name = os.path.splitext(self.base)[0]
 
         self.x, self.y = read_csv(path)
+        if self.USE_FLOAT32:
+            self.x = self.x.astype(np.float32)
+            self.y = self.y.astype(np.float32)
 
         self.composite_curve: curves.Curve = None
+        self.plot_x: Optional[NDArray] = None
 
 def read_csv(path: str) -> tuple[NDArray]:
     """
-    Reads a csv file based on a path. Skips headers.
+    Reads a csv file based on a path. Skips headers. The delimiter and header
+    are detected with csv.Sniffer (or taken from a file of the same type that
+    was already read), then the file is parsed by numpy's C parser.
 
     Returns
-        x, y (np.arrays): Values from the first and second columns of the file.
+        x, y (np.arrays): Values from the first and second columns of the file,
+            as separate contiguous float64 arrays, so fitting and plotting
+            don't stride over the parsed 2-column array.
+
+    Raises ValueError if the file can't be parsed, or has fewer than two rows
+    of data.
     """
-    with open(path, 'r') as csvfile:
+    # Only the first 1024 bytes are sniffed, so read and decode just those.
+    with open(path, 'rb') as csvfile:
+        first_bytes = csvfile.read(1024)
 
-        first_characters = csvfile.read(1024) # First 1024 chars
+    key = (os.path.splitext(path)[1].lower(), first_bytes.split(b'\n', 1)[0])
+    if key in _dialect_cache:
+        dialect = _dialect_cache[key]
+    else:
+        first_characters = first_bytes.decode('utf-8', errors='replace')
         sniffer = csv.Sniffer()
-        dialect = sniffer.sniff(first_characters)
-        has_headers = sniffer.has_header(first_characters)
+        sniffed = sniffer.sniff(first_characters)
+        dialect = (sniffed.delimiter, sniffed.quotechar,
+                   sniffer.has_header(first_characters))
+    delimiter, quotechar, has_headers = dialect
+
+    # loadtxt splits on any run of whitespace if delimiter is None.
+    if delimiter.isspace():
+        delimiter = None
 
-        csvfile.seek(0) # Start from beginning of file.
-        reader = csv.reader(csvfile, dialect)
-        if has_headers:
-            next(reader) # Skip first row. Deals with ImageJ headers.
+    # Skip first row if it's a header. Deals with ImageJ headers.
+    data = np.loadtxt(path, delimiter=delimiter, quotechar=quotechar,
+                      skiprows=int(has_headers), usecols=(0, 1),
+                      dtype=np.float64, ndmin=2)
+    if data.shape[0] < 2:
+        raise ValueError(f"{path} has fewer than two rows of data.")
 
-        data = np.array(list(reader), dtype=float)
-        x, y = data[:, 0], data[:, 1]
-        return x, y
+    # Only dialects that parsed a file are reused for later files.
+    _dialect_cache[key] = dialect
 
+    x = np.ascontiguousarray(data[:, 0])
+    y = np.ascontiguousarray(data[:, 1])
+    return x, y
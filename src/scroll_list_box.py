@@ -52,10 +52,12 @@ class ScrollListBox(tk.Frame):
     def update(self):
         """
         Pulls names from the file-manager's qd_list and populates the listbox.
+        All names are inserted in a single call.
         """
         self.clear_listbox()
-        for qd in self.file_manager.qd_list:
-            self.add_filename_to_listbox(qd.base)
+        names = [qd.base for qd in self.file_manager.qd_list]
+        if names:
+            self.listbox.insert(tk.END, *names)
 
 
     def open_from_event(self, event: tk.EventType) -> None:
@@ -72,11 +74,16 @@ class ScrollListBox(tk.Frame):
 
     def import_files(self):
         """
-        Tells the file manager to import files.
-        Tells the window to set a message.
-        Tells the scroll_list_box (self) to pull filenames from file manager.
+        Tells the file manager to import files, which it does in the
+        background.
+        Once they are imported, tells the window to set a message and the
+        scroll_list_box (self) to pull filenames from file manager.
         """
-        self.file_manager.import_files()
+        self.file_manager.import_files(on_done=self.files_imported)
+
+
+    def files_imported(self):
+        """ Called by the file manager once imported files are read. """
         self.file_manager_window.set_message("Double click to open.")
         self.update()
 
@@ -91,6 +98,3 @@ class ScrollListBox(tk.Frame):
 
     def clear_listbox(self) -> None:
         self.listbox.delete(0, tk.END)
-
-    def add_filename_to_listbox(self, name: str) -> None:
-        self.listbox.insert(tk.END, name)
\ No newline at end of file
@@ -26,7 +26,9 @@ class CreateToolTip(object):
         widget: The tk.Button object that hovering over creates a tooltip for.
         text: The text to appear in the tooltip.
         id: The integer identifier of the scheduled callback for tkinter.
-        tw: The tk.Toplevel window that is created to house the tooltip.
+        tw: The tk.Toplevel window that houses the tooltip. Created on first
+            show, then withdrawn and shown again rather than recreated.
+        label: The tk.Label in tw that shows the text.
     """
     def __init__(self, widget: tk.Button, text: str = 'widget info'):
         self.waittime: int = 500
@@ -38,6 +40,7 @@ class CreateToolTip(object):
         self.widget.bind("<ButtonPress>", self.leave)
         self.id: int = None
         self.tw: tk.Toplevel = None
+        self.label: tk.Label = None
 
     def enter(self, event=None):
         self.schedule()
@@ -62,20 +65,22 @@ class CreateToolTip(object):
         x += self.widget.winfo_rootx() + 25
         y += self.widget.winfo_rooty() + 20
 
-        # creates a toplevel window
-        self.tw = tk.Toplevel(self.widget)
+        # creates a toplevel window the first time
+        if self.tw is None:
+            self.tw = tk.Toplevel(self.widget)
 
-        # Leaves only the label and removes the app window
-        self.tw.wm_overrideredirect(True)
+            # Leaves only the label and removes the app window
+            self.tw.wm_overrideredirect(True)
+            self.label = tk.Label(self.tw, justify='left',
+                                  background="#ffffff", foreground='#000000',
+                                  relief='solid', borderwidth=1,
+                                  wraplength = self.wraplength)
+            self.label.pack(ipadx=1)
+
+        self.label.configure(text=self.text)
         self.tw.wm_geometry("+%d+%d" % (x, y))
-        label = tk.Label(self.tw, text=self.text, justify='left',
-                         background="#ffffff", foreground='#000000',
-                         relief='solid', borderwidth=1,
-                         wraplength = self.wraplength)
-        label.pack(ipadx=1)
+        self.tw.deiconify()
 
     def hidetip(self):
-        tw = self.tw
-        self.tw = None
-        if tw:
-            tw.destroy()
\ No newline at end of file
+        if self.tw:
+            self.tw.withdraw()
\ No newline at end of file